@@ -1,55 +1,129 @@
-import math
-import numpy as np 
+#All functions work on whole numpy arrays: use np.sin, np.cos, ... rather than the scalar math module,
+#which would force a slow element by element loop. Inside numba compiled code both are specialised.
+import importlib.util
+import numpy as np
+
+#numba is optional and only imported, through _gaia_numba, by the functions that use it
+HAS_NUMBA = importlib.util.find_spec('numba') is not None
+
+try:
+	import numexpr as ne
+	HAS_NUMEXPR = True
+except ImportError:
+	HAS_NUMEXPR = False
+
+#Ahead-of-time compiled kernels, built with 'python gaia_aot.py' and only used after enable_aot()
+HAS_AOT = False
+uvw_kernel = None
 
 #Global constants
 kappa = 0.004743717361
+DEG2RAD = np.float64(np.pi/180.0)
 
+#Galactic pole and longitude of the North Celestial Pole. No longer used by the transformations, which all
+#apply TGAL, but kept as public names for backward compatibility
 ra_pol = 192.8595
 dec_pol = 27.12825
 
 l_north = 122.932
 
-sin_dec_pol = np.sin(np.radians(dec_pol))
-cos_dec_pol = np.cos(np.radians(dec_pol))
+sin_dec_pol = float(np.sin(np.radians(dec_pol)))
+cos_dec_pol = float(np.cos(np.radians(dec_pol)))
 
 TGAL = (np.array([[-0.0548755604, -0.8734370902, -0.4838350155],
 	[0.4941094279, -0.4448296300, 0.7469822445],
 	[-0.8676661490,  -0.1980763734, 0.4559837762]]))
 
+#Elements of TGAL as Python floats, so they act as plain scalars in array expressions
+T00, T01, T02 = map(float, TGAL[0])
+T10, T11, T12 = map(float, TGAL[1])
+T20, T21, T22 = map(float, TGAL[2])
+
+
+def enable_aot():
+	"""Makes equatorial_UVW use the ahead-of-time compiled gaia_kernels module when no errors are given. Raises ImportError if it has not been built"""
+	global HAS_AOT, uvw_kernel
+	from gaia_kernels import uvw_kernel
+	HAS_AOT = True
+
+def _numba_kernels():
+	"""Imports and returns the _gaia_numba module, or None if numba is not installed or fails to import, in which case HAS_NUMBA is switched off"""
+	global HAS_NUMBA
+	if not HAS_NUMBA:
+		return None
+	try:
+		import _gaia_numba
+	except ImportError:
+		HAS_NUMBA = False
+		return None
+	return _gaia_numba
+
+def _as_float_array(x):
+	"""Converts x to a contiguous float64 numpy array, so that lists and pandas Series are copied only once. Scalars become arrays of shape (1,). None is returned unchanged"""
+	if x is None:
+		return None
+	return np.ascontiguousarray(x, dtype=np.float64)
+
+def _restore_shape(x, shape):
+	"""Reshapes the flat result x to the input shape, returning a scalar when shape is ()"""
+	return x.reshape(shape)[()]
+
+def _store(x, out):
+	"""Copies x into out and returns it, or returns x itself when out is None"""
+	if out is None:
+		return x
+	out[...] = x
+	return out
+
+def _equatorial_unit_vector(ra,dec):
+	"""Returns the array of equatorial unit vectors (cos ra cos dec, sin ra cos dec, sin dec) of shape (3,)+ra.shape, ra and dec in degrees"""
+	ra_rad = np.multiply(ra, DEG2RAD)
+	dec_rad = np.multiply(dec, DEG2RAD)
+	cos_dec = np.cos(dec_rad)
+	unit = np.empty((3,) + np.shape(ra_rad))
+	np.multiply(cos_dec, np.cos(ra_rad), out=unit[0,...])
+	np.multiply(cos_dec, np.sin(ra_rad), out=unit[1,...])
+	np.sin(dec_rad, out=unit[2,...])
+	return unit
+
+def _xyz_from_unit(unit,dist):
+	"""Rotates equatorial unit vectors of shape (3,...) to the Galactic frame with TGAL and scales them by dist, returning an array of the same shape"""
+	#tensordot contracts the first axis of unit whatever the number of trailing star axes
+	return np.tensordot(TGAL, unit, 1) * dist
+
 
 def equatorial_galactic(ra,dec):
 	"""Transforms equatorial coordinates (ra,dec) to Galactic coordinates (gl,gb). All inputs must be numpy arrays of the same dimension
 	
 		param ra: Right ascension (degrees)
 		param dec: Declination (degrees)
-		output (gl,gb): Tuple containing Galactic longitude and latitude (degrees)
+		output (gl,gb): Tuple containing Galactic longitude and latitude (degrees), numpy arrays with the shape of ra, or scalars if ra and dec are scalars.
+		Pandas Series are returned as plain numpy arrays, without their index.
 	"""
 	
-	#Check for parameter consistency
+	#Check for parameter consistency, the computation runs on flat arrays and the results get the shape of ra back
+	shape = np.shape(ra)
+	ra = _as_float_array(ra).ravel()
+	dec = _as_float_array(dec).ravel()
 	num_stars = np.size(ra)
 	if np.size(dec) != num_stars:
 		raise ValueError('The dimensions ra and dec do not agree. They must all be numpy arrays of the same length.')
 	
-	#Compute intermediate quantities
-	ra_m_ra_pol = ra - ra_pol
-	sin_ra = np.sin(np.radians(ra_m_ra_pol))
-	cos_ra = np.cos(np.radians(ra_m_ra_pol))
-	sin_dec = np.sin(np.radians(dec))
-	cos_dec = np.cos(np.radians(dec))
+	#Rotate the equatorial unit vectors to Galactic direction cosines
+	(gx, gy, gz) = np.tensordot(TGAL, _equatorial_unit_vector(ra,dec), 1)
 	
-	#Compute Galactic latitude
-	gamma = sin_dec_pol*sin_dec + cos_dec_pol*cos_dec*cos_ra
-	gb = np.degrees(np.arcsin(gamma))
+	#Compute Galactic latitude, arctan2 stays well conditioned near the poles
+	gb = np.degrees(np.arctan2(gz, np.hypot(gx,gy)))
 	
-	#Compute Galactic longitude
-	x1 = cos_dec * sin_ra
-	x2 = (sin_dec - sin_dec_pol*gamma)/cos_dec_pol
-	gl = l_north - np.degrees(np.arctan2(x1,x2))
-	gl = (gl+360.)%(360.)
-	#gl = np.mod(gl,360.0) might be better
+	#Compute Galactic longitude into an explicit array, so the in place steps below also work on 0-d input
+	gl = np.empty(np.shape(gx))
+	np.arctan2(gy, gx, out=gl)
+	np.degrees(gl, out=gl)
+	#arctan2 lies in [-180,180] so gl only needs wrapping when negative, done in place
+	np.add(gl, 360., out=gl, where=gl<0)
 	
 	#Return Galactic coordinates tuple
-	return (gl, gb)
+	return (_restore_shape(gl, shape), _restore_shape(gb, shape))
 
 def equatorial_XYZ(ra,dec,dist,dist_error=None):
 	"""
@@ -62,41 +136,79 @@ def equatorial_XYZ(ra,dec,dist,dist_error=None):
 	
 	output (X,Y,Z): Tuple containing Galactic position XYZ (parsec)
 	output (X,Y,Z,EX,EY,EZ): Tuple containing Galactic position XYZ and their measurement errors, used if any measurement errors are given as inputs (parsec)
+	The outputs are numpy arrays with the shape of ra, or scalars if the inputs are scalars. Pandas Series are returned as plain numpy arrays, without their index.
 	"""
 	
-	#Verify keywords
+	#Verify keywords, the computation runs on flat arrays and the results get the shape of ra back
+	shape = np.shape(ra)
+	ra = _as_float_array(ra).ravel()
+	dec = _as_float_array(dec).ravel()
+	dist = _as_float_array(dist).ravel()
+	if dist_error is not None:
+		dist_error = _as_float_array(dist_error).ravel()
 	num_stars = np.size(ra)
 	if np.size(dec) != num_stars or np.size(dist) != num_stars:
 		raise ValueError('ra, dec and distance must all be numpy arrays of the same size !')
 	if dist_error is not None and np.size(dist_error) != num_stars:
 		raise ValueError('dist_error must be a numpy array of the same size as ra !')
 	
-	#Compute Galactic coordinates
-	(gl, gb) = equatorial_galactic(ra,dec)
-	
-	cos_gl = np.cos(np.radians(gl))
-	cos_gb = np.cos(np.radians(gb))
-	sin_gl = np.sin(np.radians(gl))
-	sin_gb = np.sin(np.radians(gb))
-	
-	X = cos_gb * cos_gl * dist
-	Y = cos_gb * sin_gl * dist
-	Z = sin_gb * dist
+	#Rotate the equatorial unit vectors to Galactic direction cosines, which are also the derivatives of XYZ with respect to distance
+	cosines = np.tensordot(TGAL, _equatorial_unit_vector(ra,dec), 1)
+	(X, Y, Z) = cosines * dist
 	
 	if dist_error is not None:
-		#X_gb = sin_gb * cos_gl * dist * np.pi/180.
-		#X_gl = cos_gb * sin_gl * dist * np.pi/180.
-		X_dist = cos_gb * cos_gl
-		EX = np.abs(X_dist * dist_error)
-		Y_dist = cos_gb * sin_gl
-		EY = np.abs(Y_dist * dist_error)
-		Z_dist = sin_gb
-		EZ = np.abs(Z_dist * dist_error)
-		return (X, Y, Z, EX, EY, EZ)
+		#XYZ already exist, so the errors can overwrite the direction cosines in place
+		(EX, EY, EZ) = np.abs(np.multiply(cosines, dist_error, out=cosines), out=cosines)
+		results = (X, Y, Z, EX, EY, EZ)
 	else:
-		return (X, Y, Z)
+		results = (X, Y, Z)
+	
+	#Return arrays with the shape of ra, or scalars if scalars were given
+	return tuple(_restore_shape(x, shape) for x in results)
 		
-def equatorial_UVW(ra,dec,pmra,pmdec,rv,dist,pmra_error=None,pmdec_error=None,rv_error=None,dist_error=None):
+def equatorial_XYZ_batch(eq):
+	"""
+	Transforms equatorial coordinates (ra,dec) and distance to Galactic position XYZ, with all stars packed in a single array.
+	
+	param eq: Array of shape (N,3) whose columns are right ascension (degrees), declination (degrees) and distance (parsec)
+	
+	output XYZ: Array of shape (3,N) whose rows are the Galactic positions X, Y and Z (parsec)
+	"""
+	
+	#Verify keywords
+	eq = _as_float_array(eq)
+	if eq.ndim != 2 or eq.shape[1] != 3:
+		raise ValueError('eq must be a numpy array of shape (N,3) holding ra, dec and distance !')
+	
+	#Rotate the equatorial unit vectors of all stars with one matrix product
+	unit = _equatorial_unit_vector(eq[:,0],eq[:,1])
+	return _xyz_from_unit(unit,eq[:,2])
+
+def _verify_UVW_keywords(ra,dec,pmra,pmdec,rv,dist,pmra_error,pmdec_error,rv_error,dist_error):
+	"""Checks that the inputs of equatorial_UVW have consistent sizes and returns the number of stars"""
+	
+	num_stars = ra.shape[0]
+	if np.size(dec) != num_stars or np.size(pmra) != num_stars or np.size(pmdec) != num_stars or np.size(rv) != num_stars or np.size(dist) != num_stars:
+		raise ValueError('ra, dec, pmra, pmdec, rv and distance must all be numpy arrays of the same size !')
+	if pmra_error is not None and np.size(pmra_error) != num_stars:
+		raise ValueError('pmra_error must be a numpy array of the same size as ra !')
+	if pmdec_error is not None and np.size(pmdec_error) != num_stars:
+		raise ValueError('pmdec_error must be a numpy array of the same size as ra !')
+	if rv_error is not None and np.size(rv_error) != num_stars:
+		raise ValueError('rv_error must be a numpy array of the same size as ra !')
+	if dist_error is not None and np.size(dist_error) != num_stars:
+		raise ValueError('dist_error must be a numpy array of the same size as ra !')
+	return num_stars
+
+def _uvw_block(out, num_rows, num_stars):
+	"""Returns out after checking that it is a float64 array of shape (num_rows,num_stars), or a new such array when out is None"""
+	if out is None:
+		return np.empty((num_rows, num_stars))
+	if not isinstance(out, np.ndarray) or out.dtype != np.float64 or out.shape != (num_rows, num_stars):
+		raise ValueError('out must be a float64 numpy array of shape (3,N), or (6,N) if errors are given !')
+	return out
+
+def equatorial_UVW(ra,dec,pmra,pmdec,rv,dist,pmra_error=None,pmdec_error=None,rv_error=None,dist_error=None,out=None):
 	"""
 	Transforms equatorial coordinates (ra,dec), proper motion (pmra,pmdec), radial velocity and distance to space velocities UVW. All inputs must be numpy arrays of the same dimension.
 	
@@ -112,52 +224,76 @@ def equatorial_UVW(ra,dec,pmra,pmdec,rv,dist,pmra_error=None,pmdec_error=None,rv
 	param pmdec_error: Error on proper motion in declination (milliarcsecond per year)
 	param rv_error: Error on radial velocity (kilometers per second)
 	param dist_error: Error on distance (parsec)
+	param out: Optional float64 array of shape (3,N), or (6,N) if any errors are given, in which the results are written and which is returned, to reuse a buffer between calls
 	
-	output (U,V,W): Tuple containing Space velocities UVW (kilometers per second)
-	output (U,V,W,EU,EV,EW): Tuple containing Space velocities UVW and their measurement errors, used if any measurement errors are given as inputs (kilometers per second)
+	output (U,V,W): Contiguous (3,N) array whose rows are the Space velocities UVW (kilometers per second)
+	output (U,V,W,EU,EV,EW): Contiguous (6,N) array whose rows are the Space velocities UVW and their measurement errors, used if any measurement errors are given as inputs (kilometers per second)
+	Scalar inputs are treated as a single star, giving a (3,1) or (6,1) array.
+	Both unpack like the tuples returned previously.
 	"""
 	
 	#Verify keywords
-	num_stars = np.size(ra)
-	if np.size(dec) != num_stars or np.size(pmra) != num_stars or np.size(pmdec) != num_stars or np.size(dist) != num_stars:
-		raise ValueError('ra, dec, pmra, pmdec, rv and distance must all be numpy arrays of the same size !')
-	if pmra_error is not None and np.size(pmra_error) != num_stars:
-		raise ValueError('pmra_error must be a numpy array of the same size as ra !')
-	if pmdec_error is not None and np.size(pmdec_error) != num_stars:
-		raise ValueError('pmdec_error must be a numpy array of the same size as ra !')
-	if rv_error is not None and np.size(rv_error) != num_stars:
-		raise ValueError('rv_error must be a numpy array of the same size as ra !')
-	if dist_error is not None and np.size(dist_error) != num_stars:
-		raise ValueError('dist_error must be a numpy array of the same size as ra !')
+	(ra,dec,pmra,pmdec,rv,dist,pmra_error,pmdec_error,rv_error,dist_error) = map(_as_float_array, (ra,dec,pmra,pmdec,rv,dist,pmra_error,pmdec_error,rv_error,dist_error))
+	num_stars = _verify_UVW_keywords(ra,dec,pmra,pmdec,rv,dist,pmra_error,pmdec_error,rv_error,dist_error)
+	
+	#Use the precompiled kernel when no errors need to be propagated
+	no_errors = pmra_error is None and pmdec_error is None and rv_error is None and dist_error is None
+	if HAS_AOT and no_errors:
+		if out is not None:
+			out = _uvw_block(out, 3, num_stars)
+		return _store(uvw_kernel(ra,dec,pmra,pmdec,rv,dist,TGAL,kappa), out)
+	
+	#Write all results into the rows of a single block, the one given as out if any
+	uvw = _uvw_block(out, 3 if no_errors else 6, num_stars)
+	(U_out, V_out, W_out) = uvw[:3]
+	if not no_errors:
+		(EU_out, EV_out, EW_out) = uvw[3:]
 	
 	#Compute elements of the T matrix
-	cos_ra = np.cos(np.radians(ra))
-	cos_dec = np.cos(np.radians(dec))
-	sin_ra = np.sin(np.radians(ra))
-	sin_dec = np.sin(np.radians(dec))
-	T1 = TGAL[0,0]*cos_ra*cos_dec + TGAL[0,1]*sin_ra*cos_dec + TGAL[0,2]*sin_dec
-	T2 = -TGAL[0,0]*sin_ra + TGAL[0,1]*cos_ra
-	T3 = -TGAL[0,0]*cos_ra*sin_dec - TGAL[0,1]*sin_ra*sin_dec + TGAL[0,2]*cos_dec
-	T4 = TGAL[1,0]*cos_ra*cos_dec + TGAL[1,1]*sin_ra*cos_dec + TGAL[1,2]*sin_dec
-	T5 = -TGAL[1,0]*sin_ra + TGAL[1,1]*cos_ra
-	T6 = -TGAL[1,0]*cos_ra*sin_dec - TGAL[1,1]*sin_ra*sin_dec + TGAL[1,2]*cos_dec
-	T7 = TGAL[2,0]*cos_ra*cos_dec + TGAL[2,1]*sin_ra*cos_dec + TGAL[2,2]*sin_dec
-	T8 = -TGAL[2,0]*sin_ra + TGAL[2,1]*cos_ra
-	T9 = -TGAL[2,0]*cos_ra*sin_dec - TGAL[2,1]*sin_ra*sin_dec + TGAL[2,2]*cos_dec
+	ra_rad = np.multiply(ra, DEG2RAD)
+	dec_rad = np.multiply(dec, DEG2RAD)
+	cos_ra = np.cos(ra_rad)
+	cos_dec = np.cos(dec_rad)
+	sin_ra = np.sin(ra_rad)
+	sin_dec = np.sin(dec_rad)
+	ccd = cos_ra*cos_dec
+	scd = sin_ra*cos_dec
+	csd = cos_ra*sin_dec
+	ssd = sin_ra*sin_dec
+	T1 = T00*ccd + T01*scd + T02*sin_dec
+	T2 = -T00*sin_ra + T01*cos_ra
+	T3 = -T00*csd - T01*ssd + T02*cos_dec
+	T4 = T10*ccd + T11*scd + T12*sin_dec
+	T5 = -T10*sin_ra + T11*cos_ra
+	T6 = -T10*csd - T11*ssd + T12*cos_dec
+	T7 = T20*ccd + T21*scd + T22*sin_dec
+	T8 = -T20*sin_ra + T21*cos_ra
+	T9 = -T20*csd - T21*ssd + T22*cos_dec
 	
 	#Calculate UVW
-	reduced_dist = []
-	for i in range(len(dist)):
-		red = kappa*dist[i]
-		reduced_dist.append(red)
-	#reduced_dist = kappa*dist
-	U = T1*rv + T2*pmra*reduced_dist + T3*pmdec*reduced_dist
-	V = T4*rv + T5*pmra*reduced_dist + T6*pmdec*reduced_dist
-	W = T7*rv + T8*pmra*reduced_dist + T9*pmdec*reduced_dist
-	
-	#Return only (U, V, W) tuple if no errors are set
-	if pmra_error is None and pmdec_error is None and rv_error is None and dist_error is None:
-		return (U, V, W)
+	reduced_dist = kappa*dist
+	if HAS_NUMEXPR:
+		#Evaluate each component in a single fused loop without temporaries
+		uvw_terms = {'T1':T1, 'T2':T2, 'T3':T3, 'T4':T4, 'T5':T5, 'T6':T6, 'T7':T7, 'T8':T8, 'T9':T9,
+			'rv':rv, 'pmra':pmra, 'pmdec':pmdec, 'rd':reduced_dist}
+		U = ne.evaluate('T1*rv + (T2*pmra + T3*pmdec)*rd', local_dict=uvw_terms, out=U_out)
+		V = ne.evaluate('T4*rv + (T5*pmra + T6*pmdec)*rd', local_dict=uvw_terms, out=V_out)
+		W = ne.evaluate('T7*rv + (T8*pmra + T9*pmdec)*rd', local_dict=uvw_terms, out=W_out)
+	else:
+		#Accumulate in place so each component needs a single output buffer
+		U = np.multiply(T1, rv, out=U_out)
+		U += T2*pmra*reduced_dist
+		U += T3*pmdec*reduced_dist
+		V = np.multiply(T4, rv, out=V_out)
+		V += T5*pmra*reduced_dist
+		V += T6*pmdec*reduced_dist
+		W = np.multiply(T7, rv, out=W_out)
+		W += T8*pmra*reduced_dist
+		W += T9*pmdec*reduced_dist
+	
+	#Return only (U, V, W) if no errors are set
+	if no_errors:
+		return uvw
 		
 	#Propagate errors if they are specified
 	if pmra_error is None:
@@ -168,38 +304,108 @@ def equatorial_UVW(ra,dec,pmra,pmdec,rv,dist,pmra_error=None,pmdec_error=None,rv
 		rv_error = np.zeros(num_stars)
 	if dist_error is None:
 		dist_error = np.zeros(num_stars)
-	reduced_dist_error = []
-	for i in range(len(dist_error)):
-		red = kappa*dist_error[i]
-		reduced_dist_error.append(red)
-	#reduced_dist_error = kappa*dist_error
+	reduced_dist_error = kappa*dist_error
+	
+	#Squares of the proper motions and their errors are shared by the three components
+	pmra2 = pmra*pmra
+	pmdec2 = pmdec*pmdec
+	pmra_error2 = pmra_error*pmra_error
+	pmdec_error2 = pmdec_error*pmdec_error
 	
 	#Calculate derivatives
-	T23_pm = np.sqrt((T2*pmra)**2+(T3*pmdec)**2)
-	T23_pm_error = np.sqrt((T2*pmra_error)**2+(T3*pmdec_error)**2)
+	T2_sq = T2*T2
+	T3_sq = T3*T3
+	T23_pm = np.sqrt(T2_sq*pmra2 + T3_sq*pmdec2)
+	T23_pm_error = np.sqrt(T2_sq*pmra_error2 + T3_sq*pmdec_error2)
 	EU_rv = T1 * rv_error
 	EU_pm = T23_pm_error * reduced_dist
 	EU_dist = T23_pm * reduced_dist_error
 	EU_dist_pm = T23_pm_error * reduced_dist_error
 	
-	T56_pm = np.sqrt((T5*pmra)**2+(T6*pmdec)**2)
-	T56_pm_error = np.sqrt((T5*pmra_error)**2+(T6*pmdec_error)**2)
+	T5_sq = T5*T5
+	T6_sq = T6*T6
+	T56_pm = np.sqrt(T5_sq*pmra2 + T6_sq*pmdec2)
+	T56_pm_error = np.sqrt(T5_sq*pmra_error2 + T6_sq*pmdec_error2)
 	EV_rv = T4 * rv_error
 	EV_pm = T56_pm_error * reduced_dist
 	EV_dist = T56_pm * reduced_dist_error
 	EV_dist_pm = T56_pm_error * reduced_dist_error
 
-	T89_pm = np.sqrt((T8*pmra)**2+(T9*pmdec)**2)
-	T89_pm_error = np.sqrt((T8*pmra_error)**2+(T9*pmdec_error)**2)
+	T8_sq = T8*T8
+	T9_sq = T9*T9
+	T89_pm = np.sqrt(T8_sq*pmra2 + T9_sq*pmdec2)
+	T89_pm_error = np.sqrt(T8_sq*pmra_error2 + T9_sq*pmdec_error2)
 	EW_rv = T7 * rv_error
 	EW_pm = T89_pm_error * reduced_dist
 	EW_dist = T89_pm * reduced_dist_error
 	EW_dist_pm = T89_pm_error * reduced_dist_error
 	
 	#Calculate error bars
-	EU = np.sqrt(EU_rv**2 + EU_pm**2 + EU_dist**2 + EU_dist_pm**2)
-	EV = np.sqrt(EV_rv**2 + EV_pm**2 + EV_dist**2 + EV_dist_pm**2)
-	EW = np.sqrt(EW_rv**2 + EW_pm**2 + EW_dist**2 + EW_dist_pm**2)
+	if HAS_NUMEXPR:
+		EU = ne.evaluate('sqrt(EU_rv**2 + EU_pm**2 + EU_dist**2 + EU_dist_pm**2)', out=EU_out)
+		EV = ne.evaluate('sqrt(EV_rv**2 + EV_pm**2 + EV_dist**2 + EV_dist_pm**2)', out=EV_out)
+		EW = ne.evaluate('sqrt(EW_rv**2 + EW_pm**2 + EW_dist**2 + EW_dist_pm**2)', out=EW_out)
+	else:
+		EU = np.hypot(np.hypot(EU_rv, EU_pm), np.hypot(EU_dist, EU_dist_pm), out=EU_out)
+		EV = np.hypot(np.hypot(EV_rv, EV_pm), np.hypot(EV_dist, EV_dist_pm), out=EV_out)
+		EW = np.hypot(np.hypot(EW_rv, EW_pm), np.hypot(EW_dist, EW_dist_pm), out=EW_out)
 	
 	#Return measurements and error bars
-	return (U, V, W, EU, EV, EW)
+	return uvw
+
+def equatorial_UVW_ufunc(ra, dec, pmra, pmdec, rv, dist, out=None):
+	"""
+	Element-wise version of equatorial_UVW without errors. The inputs are broadcast against each other and may have any shape.
+	Uses a parallel numba gufunc, compiled on the first call, or equatorial_UVW if numba is not installed or fails to import.
+	
+	See equatorial_UVW for the parameters.
+	param out: Optional tuple of three arrays with the broadcast shape in which U, V and W are written
+	
+	output (U,V,W): Tuple containing Space velocities UVW with the broadcast shape of the inputs (kilometers per second)
+	"""
+	
+	_gaia_numba = _numba_kernels()
+	if _gaia_numba is not None:
+		uvw_ufunc = _gaia_numba._get_uvw_ufunc()
+		if out is None:
+			return uvw_ufunc(ra, dec, pmra, pmdec, rv, dist, TGAL, kappa)
+		return uvw_ufunc(ra, dec, pmra, pmdec, rv, dist, TGAL, kappa, out=out)
+	
+	#equatorial_UVW works on 1-D arrays, so flatten the broadcast inputs and restore their shape afterwards
+	inputs = np.broadcast_arrays(ra, dec, pmra, pmdec, rv, dist)
+	shape = inputs[0].shape
+	uvw = equatorial_UVW(*[np.ravel(x) for x in inputs])
+	if out is None:
+		return tuple(x.reshape(shape) for x in uvw)
+	for (o, x) in zip(out, uvw):
+		o[...] = x.reshape(shape)
+	return out
+
+def equatorial_UVW_numba(ra,dec,pmra,pmdec,rv,dist,pmra_error=None,pmdec_error=None,rv_error=None,dist_error=None,out=None):
+	"""
+	Same as equatorial_UVW, but computes all stars in a single compiled, multithreaded loop. Falls back to equatorial_UVW if numba is not installed or fails to import.
+	
+	See equatorial_UVW for the parameters and outputs.
+	"""
+	
+	_gaia_numba = _numba_kernels()
+	if _gaia_numba is None:
+		return equatorial_UVW(ra,dec,pmra,pmdec,rv,dist,pmra_error,pmdec_error,rv_error,dist_error,out)
+	
+	#Verify keywords
+	(ra,dec,pmra,pmdec,rv,dist,pmra_error,pmdec_error,rv_error,dist_error) = map(_as_float_array, (ra,dec,pmra,pmdec,rv,dist,pmra_error,pmdec_error,rv_error,dist_error))
+	num_stars = _verify_UVW_keywords(ra,dec,pmra,pmdec,rv,dist,pmra_error,pmdec_error,rv_error,dist_error)
+	use_errors = pmra_error is not None or pmdec_error is not None or rv_error is not None or dist_error is not None
+	
+	#Skip the error propagation entirely if no errors are set
+	if not use_errors:
+		uvw = _uvw_block(out, 3, num_stars)
+		_gaia_numba._uvw_kernel(ra,dec,pmra,pmdec,rv,dist,TGAL,kappa,*uvw)
+		return uvw
+	
+	#Missing errors are treated as zero, as in equatorial_UVW
+	zeros = np.zeros(num_stars)
+	errors = [x if x is not None else zeros for x in (pmra_error,pmdec_error,rv_error,dist_error)]
+	uvw = _uvw_block(out, 6, num_stars)
+	_gaia_numba._uvw_error_kernel(ra,dec,pmra,pmdec,rv,dist,*errors,TGAL,kappa,*uvw)
+	return uvw
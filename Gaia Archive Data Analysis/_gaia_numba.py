@@ -0,0 +1,72 @@
+"""
+Numba kernels used by GaiaFunctions. This module is imported on the first call that needs it, so that importing GaiaFunctions does not pay the numba start-up cost.
+
+The kernels are cached on disk, and numba bakes module globals into the compiled code as constants. The rotation matrix and kappa therefore
+come in as arguments from GaiaFunctions, so a cached kernel can never disagree with the NumPy code; only the fixed DEG2RAD is a global here.
+"""
+
+import numpy as np
+from numba import njit, prange, guvectorize, float64
+
+DEG2RAD = np.pi/180.0
+
+#Fast-math flags without nnan and ninf, since Gaia catalogues often have missing (NaN) radial velocities
+#that must propagate to the outputs as they do in the NumPy code
+FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+
+@njit(fastmath=FASTMATH, cache=True)
+def _uvw_component(g0, g1, g2, cra, sra, cdec, sdec, pmra, pmdec, rv, rd, pmra_err, pmdec_err, rv_err, rd_err, with_errors):
+	"""Computes one space velocity component and its error for a single star, given the row (g0,g1,g2) of TGAL. The error is 0 if with_errors is False"""
+	t1 = g0*cra*cdec + g1*sra*cdec + g2*sdec
+	t2 = -g0*sra + g1*cra
+	t3 = -g0*cra*sdec - g1*sra*sdec + g2*cdec
+	vel = t1*rv + t2*pmra*rd + t3*pmdec*rd
+	if not with_errors:
+		return vel, 0.
+	
+	t_pm = np.hypot(t2*pmra, t3*pmdec)
+	t_pm_err = np.hypot(t2*pmra_err, t3*pmdec_err)
+	e_rv = t1*rv_err
+	e_pm = t_pm_err*rd
+	e_dist = t_pm*rd_err
+	e_dist_pm = t_pm_err*rd_err
+	err = np.hypot(np.hypot(e_rv, e_pm), np.hypot(e_dist, e_dist_pm))
+	return vel, err
+
+@njit(fastmath=FASTMATH, cache=True)
+def _uvw_star(ra, dec, pmra, pmdec, rv, dist, pmra_err, pmdec_err, rv_err, dist_err, with_errors, tgal, kappa):
+	"""Computes (U,V,W,EU,EV,EW) for a single star with the (3,3) Galactic rotation matrix tgal, shared by every compiled UVW kernel. The errors are skipped, and 0, if with_errors is False"""
+	cra = np.cos(ra*DEG2RAD)
+	sra = np.sin(ra*DEG2RAD)
+	cdec = np.cos(dec*DEG2RAD)
+	sdec = np.sin(dec*DEG2RAD)
+	rd = kappa*dist
+	rd_err = kappa*dist_err
+	(U, EU) = _uvw_component(tgal[0,0], tgal[0,1], tgal[0,2], cra, sra, cdec, sdec, pmra, pmdec, rv, rd, pmra_err, pmdec_err, rv_err, rd_err, with_errors)
+	(V, EV) = _uvw_component(tgal[1,0], tgal[1,1], tgal[1,2], cra, sra, cdec, sdec, pmra, pmdec, rv, rd, pmra_err, pmdec_err, rv_err, rd_err, with_errors)
+	(W, EW) = _uvw_component(tgal[2,0], tgal[2,1], tgal[2,2], cra, sra, cdec, sdec, pmra, pmdec, rv, rd, pmra_err, pmdec_err, rv_err, rd_err, with_errors)
+	return U, V, W, EU, EV, EW
+
+@njit(parallel=True, fastmath=FASTMATH, cache=True)
+def _uvw_kernel(ra, dec, pmra, pmdec, rv, dist, tgal, kappa, U, V, W):
+	"""Fills U,V,W in place, one star per iteration without intermediate arrays"""
+	for i in prange(ra.shape[0]):
+		(U[i], V[i], W[i]) = _uvw_star(ra[i], dec[i], pmra[i], pmdec[i], rv[i], dist[i], 0., 0., 0., 0., False, tgal, kappa)[:3]
+
+@njit(parallel=True, fastmath=FASTMATH, cache=True)
+def _uvw_error_kernel(ra, dec, pmra, pmdec, rv, dist, pmra_err, pmdec_err, rv_err, dist_err, tgal, kappa, U, V, W, EU, EV, EW):
+	"""Fills U,V,W,EU,EV,EW in place, one star per iteration without intermediate arrays"""
+	for i in prange(ra.shape[0]):
+		(U[i], V[i], W[i], EU[i], EV[i], EW[i]) = _uvw_star(ra[i], dec[i], pmra[i], pmdec[i], rv[i], dist[i], pmra_err[i], pmdec_err[i], rv_err[i], dist_err[i], True, tgal, kappa)
+
+_uvw_ufunc = None
+
+def _get_uvw_ufunc():
+	"""Compiles the gufunc behind equatorial_UVW_ufunc on first use, so that importing this module stays cheap"""
+	global _uvw_ufunc
+	if _uvw_ufunc is None:
+		@guvectorize([(float64, float64, float64, float64, float64, float64, float64[:,:], float64, float64[:], float64[:], float64[:])], '(),(),(),(),(),(),(m,m),()->(),(),()', nopython=True, target='parallel', cache=True)
+		def uvw_ufunc(ra, dec, pmra, pmdec, rv, dist, tgal, kappa, U, V, W):
+			(U[0], V[0], W[0]) = _uvw_star(ra, dec, pmra, pmdec, rv, dist, 0., 0., 0., 0., False, tgal, kappa)[:3]
+		_uvw_ufunc = uvw_ufunc
+	return _uvw_ufunc
@@ -0,0 +1,30 @@
+"""
+Ahead-of-time compilation of the UVW kernel with numba, so that one-shot scripts do not pay the JIT compilation cost.
+
+Build the gaia_kernels extension module next to GaiaFunctions.py once with:
+
+	python gaia_aot.py
+
+and opt in with GaiaFunctions.enable_aot(), after which equatorial_UVW uses it whenever no errors are given.
+The rotation matrix and kappa are arguments of the kernel, so a stale build cannot disagree with GaiaFunctions.
+"""
+
+import os
+import numpy as np
+from numba.pycc import CC
+
+from _gaia_numba import _uvw_star
+
+cc = CC('gaia_kernels')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+@cc.export('uvw_kernel', 'f8[:,:](f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:,:], f8)')
+def uvw_kernel(ra, dec, pmra, pmdec, rv, dist, tgal, kappa):
+	"""Returns a (3,N) array whose rows are the space velocities U, V and W (kilometers per second), for the Galactic rotation matrix tgal"""
+	uvw = np.empty((3, ra.shape[0]))
+	for i in range(ra.shape[0]):
+		(uvw[0,i], uvw[1,i], uvw[2,i]) = _uvw_star(ra[i], dec[i], pmra[i], pmdec[i], rv[i], dist[i], 0., 0., 0., 0., False, tgal, kappa)[:3]
+	return uvw
+
+if __name__ == '__main__':
+	cc.compile()